@@ -2,6 +2,9 @@
 '''icsd testing suite'''
 
 import os
+import sys
+import math
+import functools
 import numpy as np
 import numpy.testing as nt
 import quantities as pq
@@ -26,6 +29,11 @@ for symbol, prefix, definition, u_symbol in zip(
             u_symbol=u_symbol))
     lastdefinition = definition
 
+#SI units of surface current source density and conductivity, used to pick
+#the unit-free fast path of the potential functions
+A_PER_M2 = pq.A/pq.m**2
+S_PER_M = pq.S/pq.m
+
 
 def potential_of_plane(z_j, z_i=0.*pq.m,
                       C_i=1*pq.A/pq.m**2,
@@ -51,14 +59,17 @@ def potential_of_plane(z_j, z_i=0.*pq.m,
     large distances
     
     '''
-    try:
-        assert(z_j.units == z_i.units)
-    except AssertionError as ae:
-        print('units of z_j ({}) and z_i ({}) not equal'.format(z_j.units,
-                                                                    z_i.units))
-        raise ae
+    if z_j.units != z_i.units:
+        raise ValueError('units of z_j ({}) and z_i ({}) not equal'.format(
+            z_j.units, z_i.units))
+
+    #fast path, skip unit arithmetic for input already in SI units
+    if (z_j.units == z_i.units == pq.m and C_i.units == A_PER_M2 and
+            sigma.units == S_PER_M):
+        return _potential_of_plane(z_j.magnitude, z_i.magnitude,
+                                   C_i.magnitude, sigma.magnitude)*pq.V
     
-    return -C_i/(2*sigma)*abs(z_j-z_i).simplified
+    return (-C_i/(2*sigma)*abs(z_j-z_i)).rescale(pq.V)
 
 
 def potential_of_disk(z_j,
@@ -83,14 +94,20 @@ def potential_of_disk(z_j,
     sigma : float*pq.S/pq.m
         conductivity of medium in units of S/m
     '''
-    try:
-        assert(z_j.units == z_i.units == R_i.units)
-    except AssertionError as ae:
-        print('units of z_j ({}), z_i ({}) and R_i ({}) not equal'.format(
-            z_j.units, z_i.units, R_i.units))
-        raise ae
+    if not z_j.units == z_i.units == R_i.units:
+        raise ValueError(
+            'units of z_j ({}), z_i ({}) and R_i ({}) not equal'.format(
+                z_j.units, z_i.units, R_i.units))
+
+    #fast path, skip unit arithmetic for input already in SI units
+    if (z_j.units == z_i.units == R_i.units == pq.m and
+            C_i.units == A_PER_M2 and sigma.units == S_PER_M):
+        return _potential_of_disk(z_j.magnitude, z_i.magnitude,
+                                  C_i.magnitude, R_i.magnitude,
+                                  sigma.magnitude)*pq.V
     
-    return C_i/(2*sigma)*(np.sqrt((z_j-z_i)**2 + R_i**2) - abs(z_j-z_i)).simplified
+    return (C_i/(2*sigma)*(np.sqrt((z_j-z_i)**2 + R_i**2) -
+                           abs(z_j-z_i))).rescale(pq.V)
 
 
 def potential_of_cylinder(z_j,
@@ -123,7 +140,8 @@ def potential_of_cylinder(z_j,
     Notes
     -----
     Sympy can't deal with eq. 11 in Pettersen et al 2006, J neurosci Meth,
-    so we numerically evaluate it in this function.
+    so we numerically evaluate it in this function. It serves as reference
+    for the closed form solution used by get_lfp_of_cylinders.
     
     Tested with
     
@@ -133,27 +151,140 @@ def potential_of_cylinder(z_j,
 
 
     '''
-    try:
-        assert(z_j.units == z_i.units == R_i.units == h_i.units)
-    except AssertionError as ae:
-        print('units of z_j ({}), z_i ({}), R_i ({}) and h ({}) not equal'.format(
-            z_j.units, z_i.units, R_i.units, h_i.units))
-        raise ae
-
-    #speed up tests by stripping units
-    _sigma = float(sigma)
-    _R_i = float(R_i)
-    _z_i = float(z_i)
-    _z_j = float(z_j)
-
-    #evaluate integrand using quad
-    def integrand(z):
-        return 1/(2*_sigma)*(np.sqrt((z-_z_j)**2 + _R_i**2) - abs(z-_z_j))
-        
-    phi_j, abserr = C_i*si.quad(integrand, z_i-h_i/2, z_i+h_i/2)
+    if not z_j.units == z_i.units == R_i.units == h_i.units:
+        raise ValueError(
+            'units of z_j ({}), z_i ({}), R_i ({}) and h ({}) not equal'.format(
+                z_j.units, z_i.units, R_i.units, h_i.units))
+
+    #speed up tests by stripping units, SI magnitudes combine to V
+    _sigma = float(sigma.simplified)
+    _C_i = float(C_i.simplified)
+    _R_i = float(R_i.simplified)
+    _h_i = float(h_i.simplified)
+    _z_i = float(z_i.simplified)
+    _z_j = float(z_j.simplified)
+
+    #evaluate integrand using quad, keeping only the integral estimate
+    _phi_j = si.quad(_cylinder_integrand, _z_i-_h_i/2, _z_i+_h_i/2,
+                     args=(_z_j, _R_i, _sigma))[0]
     
-    return (phi_j * z_i.units**2 / sigma.units)
+    return _C_i*_phi_j*pq.V
+
+
+def _cylinder_integrand(z, z_j, R_i, sigma):
+    '''
+    Integrand of potential_of_cylinder over source depth z. Arguments are
+    plain floats in SI units, passed by si.quad in the same order as the
+    double array of a scipy.LowLevelCallable.
+    '''
+    dz = z - z_j
+    if R_i == 0:
+        return 0.
+    return R_i*R_i/(math.sqrt(dz*dz + R_i*R_i) + math.fabs(dz))/(2*sigma)
+
+
+@functools.lru_cache(maxsize=8)
+def _scratch_array(shape, index):
+    '''
+    Return scratch float array number index of given shape, only the most
+    recently used arrays are kept
+    '''
+    return np.empty(shape)
+
+
+def _get_scratch(shape, count=1):
+    '''
+    Return list of count float arrays of given shape, reused between calls
+    of the get_lfp_of_* functions with the same number of contacts and
+    sources. The arrays are shared by all callers and must not escape the
+    function using them.
+    '''
+    return [_scratch_array(shape, index) for index in range(count)]
+
+
+def _plane_geometry(z_j, z_i, out=None):
+    '''
+    Return abs(z_j - z_i), the potential of planes in units of -C_i/(2*sigma).
+    Arguments are SI magnitudes broadcast against each other. The result is
+    written to out if given.
+    '''
+    phi = np.subtract(z_j, z_i, out=out)
+    return np.abs(phi, out=out)
+
+
+def _disk_geometry(z_j, z_i, R_i, out=None, buf=None):
+    '''
+    Return sqrt((z_j - z_i)**2 + R_i**2) - abs(z_j - z_i), the potential of
+    disks in units of C_i/(2*sigma). Arguments are SI magnitudes broadcast
+    against each other. The result is written to out if given, using buf of
+    same shape as scratch space.
+    '''
+    dz = np.subtract(z_j, z_i, out=out)
+    root = np.multiply(dz, dz, out=buf)
+    root = np.add(root, R_i*R_i, out=buf)
+    root = np.sqrt(root, out=buf)
+    return np.subtract(root, np.abs(dz, out=out), out=out)
+
+
+def _cylinder_geometry(z_j, z_i, R_i, h_i, out=None):
+    '''
+    Return the integral in eq. 11 of Pettersen et al 2006 in closed form, the
+    potential of cylinders in units of C_i/(2*sigma). Arguments are SI
+    magnitudes broadcast against each other. The result is written to out if
+    given.
+    '''
+    #sources of zero radius contribute nothing, any nonzero radius keeps the
+    #terms in brackets finite
+    R2 = R_i*R_i
+    R_safe = np.where(R_i > 0, R_i, 1.)
+
+    def F(u):
+        #antiderivative of sqrt(u**2 + R_i**2) - abs(u) with respect to u,
+        #u*(sqrt(u**2 + R_i**2) - abs(u)) rewritten without cancellation
+        return 0.5*R2*(u/(np.sqrt(u*u + R_safe*R_safe) + np.abs(u)) +
+                       np.arcsinh(u/R_safe))
+
+    return np.subtract(F(z_i + h_i/2 - z_j), F(z_i - h_i/2 - z_j), out=out)
+
 
+def _potential_of_plane(z_j, z_i, C_i, sigma):
+    '''
+    Unit-free counterpart of potential_of_plane. Arguments are SI magnitudes
+    broadcast against each other, the returned potential is in V.
+    '''
+    return -C_i/(2*sigma)*_plane_geometry(z_j, z_i)
+
+
+def _potential_of_disk(z_j, z_i, C_i, R_i, sigma):
+    '''
+    Unit-free counterpart of potential_of_disk. Arguments are SI magnitudes
+    broadcast against each other, the returned potential is in V.
+    '''
+    return C_i/(2*sigma)*_disk_geometry(z_j, z_i, R_i)
+
+
+def _import_pyplot():
+    '''
+    Return matplotlib.pyplot for the debug plots. The backend configured in
+    matplotlibrc or through MPLBACKEND is respected, except that the
+    non-interactive Agg backend replaces an interactive backend on a Linux
+    machine without a display, where the interactive one cannot start
+    '''
+    import matplotlib
+    try:
+        from matplotlib.backends import backend_registry, BackendFilter
+        interactive_bk = backend_registry.list_builtin(
+            BackendFilter.INTERACTIVE)
+    except ImportError:
+        from matplotlib.rcsetup import interactive_bk
+    headless = (sys.platform.startswith('linux') and
+                not os.environ.get('DISPLAY') and
+                not os.environ.get('WAYLAND_DISPLAY'))
+    if headless and matplotlib.get_backend().lower() in [
+            backend.lower() for backend in interactive_bk]:
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
 
 
 def get_lfp_of_planes(z_j=np.arange(21)*1E-4*pq.m,
@@ -165,15 +296,22 @@ def get_lfp_of_planes(z_j=np.arange(21)*1E-4*pq.m,
     Compute the lfp of spatially separated planes with given current source
     density
     '''
-    phi_j = np.zeros(z_j.size)*pq.V
-    for i, (zi, Ci) in enumerate(zip(z_i, C_i)):
-        for j, zj in enumerate(z_j):
-            phi_j[j] += potential_of_plane(zj, zi, Ci, sigma)
-    
-    #test plot
-    if plot:
-        import matplotlib.pyplot as plt
-        plt.figure()
+    #strip units, SI magnitudes combine to potentials in V
+    _z_j = z_j.simplified.magnitude
+    _z_i = z_i.simplified.magnitude
+    _C_i = C_i.simplified.magnitude
+    _sigma = sigma.simplified.magnitude
+
+    #geometry of each plane i (columns) at each contact j (rows), the sum
+    #over planes is a matrix-vector product with the scaled CSD
+    phi, = _get_scratch((_z_j.size, _z_i.size))
+    _plane_geometry(_z_j[:, None], _z_i[None, :], out=phi)
+    phi_j = phi.dot(-_C_i/(2*_sigma))*pq.V
+
+    #test plot, only drawn when ICSD_PLOT is set in the environment
+    if plot and os.environ.get('ICSD_PLOT'):
+        plt = _import_pyplot()
+        fig = plt.figure()
         plt.subplot(121)
         ax = plt.gca()
         ax.plot(np.zeros(z_j.size), z_j, 'r-o')
@@ -190,6 +328,10 @@ def get_lfp_of_planes(z_j=np.arange(21)*1E-4*pq.m,
         ax.set_ylim(z_j.min(), z_j.max())
         ax.set_xlabel('phi_j ({})'.format(phi_j.units))
         ax.set_title('LFP')
+
+        #release the figure unless it is kept open for inspection
+        if not plt.isinteractive():
+            plt.close(fig)
     
     return phi_j, C_i
 
@@ -204,15 +346,24 @@ def get_lfp_of_disks(z_j=np.arange(21)*1E-4*pq.m,
     Compute the lfp of spatially separated disks with a given
     current source density
     '''
-    phi_j = np.zeros(z_j.size)*pq.V
-    for i, (zi, Ci, Ri) in enumerate(zip(z_i, C_i, R_i)):
-        for j, zj in enumerate(z_j):
-            phi_j[j] += potential_of_disk(zj, zi, Ci, Ri, sigma)
-    
-    #test plot
-    if plot:
-        import matplotlib.pyplot as plt
-        plt.figure()
+    #strip units, SI magnitudes combine to potentials in V
+    _z_j = z_j.simplified.magnitude
+    _z_i = z_i.simplified.magnitude
+    _C_i = C_i.simplified.magnitude
+    _R_i = R_i.simplified.magnitude
+    _sigma = sigma.simplified.magnitude
+
+    #geometry of each disk i (columns) at each contact j (rows), the sum
+    #over disks is a matrix-vector product with the scaled CSD
+    phi, buf = _get_scratch((_z_j.size, _z_i.size), 2)
+    _disk_geometry(_z_j[:, None], _z_i[None, :], _R_i[None, :],
+                   out=phi, buf=buf)
+    phi_j = phi.dot(_C_i/(2*_sigma))*pq.V
+
+    #test plot, only drawn when ICSD_PLOT is set in the environment
+    if plot and os.environ.get('ICSD_PLOT'):
+        plt = _import_pyplot()
+        fig = plt.figure()
         plt.subplot(121)
         ax = plt.gca()
         ax.plot(np.zeros(z_j.size), z_j, 'r-o')
@@ -229,10 +380,41 @@ def get_lfp_of_disks(z_j=np.arange(21)*1E-4*pq.m,
         ax.set_ylim(z_j.min(), z_j.max())
         ax.set_xlabel('phi_j ({})'.format(phi_j.units))
         ax.set_title('LFP')
+
+        #release the figure unless it is kept open for inspection
+        if not plt.isinteractive():
+            plt.close(fig)
     
     return phi_j, C_i
     
 
+def get_lfp_of_disks_batched(z_j=np.arange(21)*1E-4*pq.m,
+                             z_i=np.array([8E-4, 10E-4, 12E-4])*pq.m,
+                             C_i=np.array([[-.5, 1., -.5]])*pq.A/pq.m**2,
+                             R_i=np.array([1, 1, 1])*1E-3*pq.m,
+                             sigma=0.3*pq.S/pq.m):
+    '''
+    Compute the lfp of spatially separated disks for a batch of current
+    source densities C_i with shape (n_batches, z_i.size), returning LFPs
+    with shape (n_batches, z_j.size)
+    '''
+    #strip units, SI magnitudes combine to potentials in V
+    _z_j = z_j.simplified.magnitude
+    _z_i = z_i.simplified.magnitude
+    _C_i = C_i.simplified.magnitude
+    _R_i = R_i.simplified.magnitude
+    _sigma = sigma.simplified.magnitude
+
+    #geometry of each disk i (columns) at each contact j (rows), shared by
+    #all batches
+    phi, buf = _get_scratch((_z_j.size, _z_i.size), 2)
+    _disk_geometry(_z_j[:, None], _z_i[None, :], _R_i[None, :],
+                   out=phi, buf=buf)
+    phi_j = (_C_i/(2*_sigma)).dot(phi.T)*pq.V
+
+    return phi_j, C_i
+
+
 def get_lfp_of_cylinders(z_j=np.arange(21)*1E-4*pq.m,
                          z_i=np.array([8E-4, 10E-4, 12E-4])*pq.m,
                          C_i=np.array([-.5, 1., -.5])*pq.A/pq.m**3,
@@ -244,15 +426,25 @@ def get_lfp_of_cylinders(z_j=np.arange(21)*1E-4*pq.m,
     Compute the lfp of spatially separated disks with a given
     current source density
     '''
-    phi_j = np.zeros(z_j.size)*pq.V
-    for i, (zi, Ci, Ri, hi) in enumerate(zip(z_i, C_i, R_i, h_i)):
-        for j, zj in enumerate(z_j):
-            phi_j[j] += potential_of_cylinder(zj, zi, Ci, Ri, hi, sigma)
-    
-    #test plot
-    if plot:
-        import matplotlib.pyplot as plt
-        plt.figure()
+    #strip units, SI magnitudes combine to potentials in V
+    _z_j = z_j.simplified.magnitude
+    _z_i = z_i.simplified.magnitude
+    _C_i = C_i.simplified.magnitude
+    _R_i = R_i.simplified.magnitude
+    _h_i = h_i.simplified.magnitude
+    _sigma = sigma.simplified.magnitude
+
+    #geometry of each cylinder i (columns) at each contact j (rows), the sum
+    #over cylinders is a matrix-vector product with the scaled CSD
+    phi, = _get_scratch((_z_j.size, _z_i.size))
+    _cylinder_geometry(_z_j[:, None], _z_i[None, :], _R_i[None, :],
+                       _h_i[None, :], out=phi)
+    phi_j = phi.dot(_C_i/(2*_sigma))*pq.V
+
+    #test plot, only drawn when ICSD_PLOT is set in the environment
+    if plot and os.environ.get('ICSD_PLOT'):
+        plt = _import_pyplot()
+        fig = plt.figure()
         plt.subplot(121)
         ax = plt.gca()
         ax.plot(np.zeros(z_j.size), z_j, 'r-o')
@@ -270,6 +462,10 @@ def get_lfp_of_cylinders(z_j=np.arange(21)*1E-4*pq.m,
         ax.set_ylim(z_j.min(), z_j.max())
         ax.set_xlabel('phi_j ({})'.format(phi_j.units))
         ax.set_title('LFP')
+
+        #release the figure unless it is kept open for inspection
+        if not plt.isinteractive():
+            plt.close(fig)
     
     return phi_j, C_i
     
@@ -283,230 +479,264 @@ class TestICSD(unittest.TestCase):
     Set of test functions for each CSD estimation method comparing
     estimate to LFPs calculated with known ground truth CSD
     '''
-    
-    def test_StandardCSD_00(self):
-        '''test using standard SI units'''
-        #set some parameters for ground truth csd and csd estimates.
-        
+
+    @classmethod
+    def setUpClass(cls):
+        '''
+        Compute the ground truth LFPs shared by the test functions once, as
+        the cylinder source LFPs in particular are costly to evaluate
+        '''
         #contact point coordinates
-        z_j = np.arange(21)*1E-4*pq.m
+        cls.z_j = np.arange(21)*1E-4*pq.m
         
         #source coordinates
-        z_i = z_j
-        
-        #current source density magnitude
-        C_i = np.zeros(z_i.size)*pq.A/pq.m**2
-        C_i[7:12:2] += np.array([-.5, 1., -.5])*pq.A/pq.m**2
-                
-        #uniform conductivity
-        sigma = 0.3*pq.S/pq.m
+        cls.z_i = cls.z_j
         
-        #flag for debug plots
-        plot = False
+        #current source density magnitude of planes and disks
+        cls.C_i_planar = np.zeros(cls.z_i.size)*pq.A/pq.m**2
+        cls.C_i_planar[7:12:2] += np.array([-.5, 1., -.5])*pq.A/pq.m**2
         
-        #get LFP and CSD at contacts
-        phi_j, C_i = get_lfp_of_planes(z_j, z_i, C_i, sigma, plot)
-        std_input = {
-            'lfp' : phi_j,
-            'coord_electrode' : z_j,
-            'sigma' : sigma,
-            'f_type' : 'gaussian',
-            'f_order' : (3, 1),
-        }
-        std_csd = icsd.StandardCSD(**std_input)
-        csd = std_csd.get_csd()
+        #current source density magnitude of cylinders
+        cls.C_i_volume = np.zeros(cls.z_i.size)*pq.A/pq.m**3
+        cls.C_i_volume[7:12:2] += np.array([-.5, 1., -.5])*pq.A/pq.m**3
         
-        self.assertEqual(C_i.units, csd.units)
-        nt.assert_array_almost_equal(C_i, csd)
-    
-
-    def test_StandardCSD_01(self):
-        '''test using non-standard SI units 1'''
-        #set some parameters for ground truth csd and csd estimates.
+        #source radius (delta, step)
+        cls.R_i = np.ones(cls.z_i.size)*1E-3*pq.m
         
-        #contact point coordinates
-        z_j = np.arange(21)*1E-4*pq.m
+        #source height (cylinder)
+        cls.h_i = np.ones(cls.z_i.size)*1E-4*pq.m
         
-        #source coordinates
-        z_i = z_j
+        #uniform conductivity, also used for top layer (z_j < 0)
+        cls.sigma = 0.3*pq.S/pq.m
         
-        #current source density magnitude
-        C_i = np.zeros(z_i.size)*pq.A/pq.m**2
-        C_i[7:12:2] += np.array([-.5, 1., -.5])*1E3*pq.A/pq.m**2
-                
-        #uniform conductivity
-        sigma = 0.3*pq.S/pq.m
+        #unit conversion factors for tests using non-standard SI units, kept
+        #as compound units since simplifying them would leave a plain 1
+        cls.mV_per_V = 1E3*pq.mV/pq.V
+        cls.mm_per_m = 1E3*pq.mm/pq.m
+        cls.mS_per_S = 1E3*pq.mS/pq.S
         
         #flag for debug plots
         plot = False
         
-        #get LFP and CSD at contacts
-        phi_j, C_i = get_lfp_of_planes(z_j, z_i, C_i, sigma, plot)
-        std_input = {
-            'lfp' : phi_j*1E3*pq.mV/pq.V,
-            'coord_electrode' : z_j,
-            'sigma' : sigma,
-            'f_type' : 'gaussian',
-            'f_order' : (3, 1),
-        }
-        std_csd = icsd.StandardCSD(**std_input)
-        csd = std_csd.get_csd()
-        
-        self.assertEqual(C_i.units, csd.units)
-        nt.assert_array_almost_equal(C_i, csd)
-
-
-    def test_StandardCSD_02(self):
-        '''test using non-standard SI units 2'''
-        #set some parameters for ground truth csd and csd estimates.
-        
-        #contact point coordinates
-        z_j = np.arange(21)*1E-4*pq.m
-        
+        #get LFP at contacts
+        cls.phi_planes, _ = get_lfp_of_planes(cls.z_j, cls.z_i,
+                                              cls.C_i_planar, cls.sigma,
+                                              plot)
+        cls.phi_disks, _ = get_lfp_of_disks(cls.z_j, cls.z_i,
+                                            cls.C_i_planar, cls.R_i,
+                                            cls.sigma, plot)
+        cls.phi_cylinders, _ = get_lfp_of_cylinders(cls.z_j, cls.z_i,
+                                                    cls.C_i_volume, cls.R_i,
+                                                    cls.h_i, cls.sigma, plot)
+        
+        #LFP and CSD of interpolated cylinder sources for the spline method
+        cls.num_steps = 201
+        cls.phi_spline, cls.C_i_spline = cls.get_lfp_of_spline(cls.z_j)
+
+
+    @classmethod
+    def get_lfp_of_spline(cls, z_j):
+        '''
+        Return LFP at contacts z_j and CSD of cylinder sources at z_i = z_j
+        with CSD, radius and height interpolated on num_steps points
+        '''
         #source coordinates
         z_i = z_j
         
         #current source density magnitude
-        C_i = np.zeros(z_i.size)*pq.A/pq.m**2
-        C_i[7:12:2] += np.array([-.5, 1., -.5])*pq.A/pq.m**2
-                
-        #uniform conductivity
-        sigma = 0.3*pq.S/pq.m
+        C_i = np.zeros(z_i.size)*pq.A/pq.m**3
+        C_i[7:12:2] += np.array([-.5, 1., -.5])*pq.A/pq.m**3
+        
+        #source radius
+        R_i = np.ones(z_i.size)*1E-3*pq.m
+
+        #construct interpolators, spline method assume underlying source
+        #pattern generating LFPs that are cubic spline interpolates between
+        #contacts so we generate CSD data relying on the same assumption 
+        f_C = interp1d(z_i, C_i, kind='cubic')
+        f_R = interp1d(z_i, R_i)
+        z_i_i = np.linspace(float(z_i[0]), float(z_i[-1]),
+                            cls.num_steps)*z_i.units
+        C_i_i = f_C(np.asarray(z_i_i))*C_i.units
+        R_i_i = f_R(z_i_i)*R_i.units
+
+        h_i_i = np.ones(z_i_i.size)*np.diff(z_i_i).min()
         
         #flag for debug plots
         plot = False
-        
+
         #get LFP and CSD at contacts
-        phi_j, C_i = get_lfp_of_planes(z_j, z_i, C_i, sigma, plot)
-        std_input = {
-            'lfp' : phi_j,
-            'coord_electrode' : z_j*1E3*pq.mm/pq.m,
-            'sigma' : sigma,
-            'f_type' : 'gaussian',
-            'f_order' : (3, 1),
+        return get_lfp_of_cylinders(z_j, z_i_i, C_i_i, R_i_i, h_i_i,
+                                    cls.sigma, plot)
+
+
+    def test_potential_of_plane_and_disk(self):
+        '''test SI unit fast path against input in non-standard SI units'''
+        z_j = 3E-4*pq.m
+        z_i = 1E-4*pq.m
+        C_i = 2*pq.A/pq.m**2
+        R_i = 1E-3*pq.m
+
+        phi_plane = potential_of_plane(z_j, z_i, C_i, self.sigma)
+        phi_disk = potential_of_disk(z_j, z_i, C_i, R_i, self.sigma)
+        self.assertEqual(phi_plane.units, pq.V)
+        self.assertEqual(phi_disk.units, pq.V)
+
+        #same conductivity given in non-standard SI units
+        sigma = self.sigma*self.mS_per_S
+        for z_j, z_i, R_i in [(z_j*self.mm_per_m, z_i*self.mm_per_m,
+                               R_i*self.mm_per_m), (z_j, z_i, R_i)]:
+            with self.subTest(units=z_j.units):
+                phi = potential_of_plane(z_j, z_i, C_i, sigma)
+                self.assertEqual(phi.units, pq.V)
+                nt.assert_allclose(float(phi), float(phi_plane))
+                phi = potential_of_disk(z_j, z_i, C_i, R_i, sigma)
+                self.assertEqual(phi.units, pq.V)
+                nt.assert_allclose(float(phi), float(phi_disk))
+
+        #coordinates in different units are rejected
+        with self.assertRaises(ValueError):
+            potential_of_plane(z_j, z_i*self.mm_per_m, C_i, self.sigma)
+        with self.assertRaises(ValueError):
+            potential_of_disk(z_j, z_i, C_i, R_i*self.mm_per_m, self.sigma)
+
+
+    def test_potential_of_cylinder(self):
+        '''test closed form cylinder potential against numerical integral'''
+        #flag for debug plots
+        plot = False
+
+        cases = {
+            'mixed' : (np.array([8E-4, 10E-4, 12E-4, 14E-4])*pq.m,
+                       np.array([-.5, 1., -.5, 1.])*pq.A/pq.m**3,
+                       np.array([1, 2, 1, 0])*1E-3*pq.m,
+                       np.array([1, 1, 2, 1])*1E-4*pq.m),
+            #radius far below the distance to every contact
+            'thin' : (np.array([8.5E-4])*pq.m,
+                      np.array([1.])*pq.A/pq.m**3,
+                      np.array([1E-9])*pq.m,
+                      np.array([5E-5])*pq.m),
         }
-        std_csd = icsd.StandardCSD(**std_input)
-        csd = std_csd.get_csd()
-        
-        self.assertEqual(C_i.units, csd.units)
-        nt.assert_array_almost_equal(C_i, csd)
-        
-        
-    def test_StandardCSD_03(self):
-        '''test using non-standard SI units 3'''
-        #set some parameters for ground truth csd and csd estimates.
-        
-        #contact point coordinates
-        z_j = np.arange(21)*1E-4*pq.m
-        
-        #source coordinates
-        z_i = z_j
-        
-        #current source density magnitude
-        C_i = np.zeros(z_i.size)*pq.A/pq.m**2
-        C_i[7:12:2] += np.array([-.5, 1., -.5])*pq.A/pq.m**2
-                
-        #uniform conductivity
-        sigma = 0.3*pq.mS/pq.m
-        
+        for name, (z_i, C_i, R_i, h_i) in cases.items():
+            with self.subTest(name):
+                phi_j, C_i = get_lfp_of_cylinders(self.z_j, z_i, C_i, R_i,
+                                                  h_i, self.sigma, plot)
+                phi_quad = np.zeros(self.z_j.size)*pq.V
+                for i in range(z_i.size):
+                    for j in range(self.z_j.size):
+                        phi_quad[j] += potential_of_cylinder(
+                            self.z_j[j], z_i[i], C_i[i], R_i[i], h_i[i],
+                            self.sigma)
+
+                self.assertEqual(phi_j.units, phi_quad.units)
+                nt.assert_allclose(np.asarray(phi_j), np.asarray(phi_quad),
+                                   rtol=1E-7)
+
+
+    def test_get_lfp_of_disks_batched(self):
+        '''test batched disk LFPs against LFPs of each CSD in the batch'''
+        C_i = np.array([[-.5, 1., -.5],
+                        [1., -2., 1.],
+                        [0., .5, 0.]])*pq.A/pq.m**2
+        R_i = np.array([1, 2, 1])*1E-3*pq.m
+
         #flag for debug plots
         plot = False
-        
+
+        phi_j, C_i = get_lfp_of_disks_batched(self.z_j, C_i=C_i, R_i=R_i,
+                                              sigma=self.sigma)
+        self.assertEqual(phi_j.shape, (C_i.shape[0], self.z_j.size))
+        for phi, C in zip(phi_j, C_i):
+            phi_disks, _ = get_lfp_of_disks(self.z_j, C_i=C, R_i=R_i,
+                                            sigma=self.sigma, plot=plot)
+            self.assertEqual(phi.units, phi_disks.units)
+            nt.assert_allclose(np.asarray(phi), np.asarray(phi_disks))
+
+    
+    def test_StandardCSD(self):
+        '''test using standard and non-standard SI units'''
         #get LFP and CSD at contacts
-        phi_j, C_i = get_lfp_of_planes(z_j, z_i, C_i, sigma, plot)
+        phi_j, C_i = self.phi_planes, self.C_i_planar
         std_input = {
             'lfp' : phi_j,
-            'coord_electrode' : z_j,
-            'sigma' : sigma*1E3*pq.mS/pq.S,
+            'coord_electrode' : self.z_j,
+            'sigma' : self.sigma,
             'f_type' : 'gaussian',
             'f_order' : (3, 1),
         }
-        std_csd = icsd.StandardCSD(**std_input)
-        csd = std_csd.get_csd()
         
-        self.assertEqual(C_i.units, csd.units)
-        nt.assert_array_almost_equal(C_i, csd)
+        #ground truth with conductivity in non-standard SI units, the LFP
+        #scales inversely with sigma
+        sigma = 0.3*pq.mS/pq.m
+        
+        #input changed from standard SI units, and CSD of each case. The LFP
+        #scales linearly with the CSD
+        cases = [
+            ('standard SI units', {}, C_i),
+            ('non-standard SI units 1',
+             {'lfp' : phi_j*1E3*self.mV_per_V}, C_i*1E3),
+            ('non-standard SI units 2',
+             {'coord_electrode' : self.z_j*self.mm_per_m}, C_i),
+            ('non-standard SI units 3',
+             {'lfp' : phi_j*(self.sigma/sigma).simplified,
+              'sigma' : sigma*self.mS_per_S}, C_i),
+        ]
+        for units, update, C_i in cases:
+            with self.subTest(units=units):
+                std_csd = icsd.StandardCSD(**dict(std_input, **update))
+                csd = std_csd.get_csd()
+                
+                self.assertEqual(C_i.units, csd.units)
+                nt.assert_allclose(csd.magnitude, C_i.magnitude, rtol=0,
+                                   atol=1.5E-6)
         
     
-    def test_DeltaiCSD_00(self):
-        '''test using standard SI units'''
-        #set some parameters for ground truth csd and csd estimates., e.g.,
+    def test_DeltaiCSD(self):
+        '''test using standard and non-standard SI units'''
         #we will use same source diameter as in ground truth
-        
-        #contact point coordinates
-        z_j = np.arange(21)*1E-4*pq.m
-        
-        #source coordinates
-        z_i = z_j
-        
-        #current source density magnitude
-        C_i = np.zeros(z_i.size)*pq.A/pq.m**2
-        C_i[7:12:2] += np.array([-.5, 1., -.5])*pq.A/pq.m**2
-        
-        #source radius (delta, step)
-        R_i = np.ones(z_i.size)*1E-3*pq.m
-        
-        #conductivity, use same conductivity for top layer (z_j < 0)
-        sigma = 0.3*pq.S/pq.m
-        sigma_top = sigma
-        
-        #flag for debug plots
-        plot = False
-
-        #get LFP and CSD at contacts
-        phi_j, C_i = get_lfp_of_disks(z_j, z_i, C_i, R_i, sigma,
-                                      plot)
+        phi_j, C_i = self.phi_disks, self.C_i_planar
         delta_input = {
             'lfp' : phi_j,
-            'coord_electrode' : z_j,
-            'diam' : R_i.mean()*2,        # source diameter
-            'sigma' : sigma,           # extracellular conductivity
-            'sigma_top' : sigma_top,       # conductivity on top of cortex
+            'coord_electrode' : self.z_j,
+            'diam' : self.R_i.mean()*2,        # source diameter
+            'sigma' : self.sigma,           # extracellular conductivity
+            'sigma_top' : self.sigma,       # conductivity on top of cortex
             'f_type' : 'gaussian',  # gaussian filter
             'f_order' : (3, 1),     # 3-point filter, sigma = 1.
         }
         
-        delta_icsd = icsd.DeltaiCSD(**delta_input)
-        csd = delta_icsd.get_csd()
-        
-        self.assertEqual(C_i.units, csd.units)
-        nt.assert_array_almost_equal(C_i, csd)
+        #input changed from standard SI units in each case
+        cases = [
+            ('standard SI units', {}),
+            ('non-standard SI units 1', {'lfp' : phi_j*self.mV_per_V}),
+            ('non-standard SI units 2',
+             {'coord_electrode' : self.z_j*self.mm_per_m,
+              'diam' : self.R_i.mean()*2*self.mm_per_m}),
+            ('non-standard SI units 3',
+             {'sigma' : self.sigma*self.mS_per_S,
+              'sigma_top' : self.sigma*self.mS_per_S}),
+        ]
+        for units, update in cases:
+            with self.subTest(units=units):
+                delta_icsd = icsd.DeltaiCSD(**dict(delta_input, **update))
+                csd = delta_icsd.get_csd()
+                
+                self.assertEqual(C_i.units, csd.units)
+                nt.assert_allclose(csd.magnitude, C_i.magnitude, rtol=0,
+                                   atol=1.5E-6)
 
 
-    def test_DeltaiCSD_01(self):
-        '''test using non-standard SI units 1'''
-        #set some parameters for ground truth csd and csd estimates., e.g.,
+    def test_DeltaiCSD_noncontinuous(self):
+        '''test non-continous z_j array'''
         #we will use same source diameter as in ground truth
-        
-        #contact point coordinates
-        z_j = np.arange(21)*1E-4*pq.m
-        
-        #source coordinates
-        z_i = z_j
-        
-        #current source density magnitude
-        C_i = np.zeros(z_i.size)*pq.A/pq.m**2
-        C_i[7:12:2] += np.array([-.5, 1., -.5])*pq.A/pq.m**2
-        
-        #source radius (delta, step)
-        R_i = np.ones(z_i.size)*1E-3*pq.m
-        
-        #conductivity, use same conductivity for top layer (z_j < 0)
-        sigma = 0.3*pq.S/pq.m
-        sigma_top = sigma
-        
-        #flag for debug plots
-        plot = False
-
-        #get LFP and CSD at contacts
-        phi_j, C_i = get_lfp_of_disks(z_j, z_i, C_i, R_i, sigma,
-                                      plot)
+        phi_j, C_i = self.phi_disks, self.C_i_planar
+        inds = np.delete(np.arange(21), 5)
         delta_input = {
-            'lfp' : phi_j*1E3*pq.mV/pq.V,
-            'coord_electrode' : z_j,
-            'diam' : R_i.mean()*2,        # source diameter
-            'sigma' : sigma,           # extracellular conductivity
-            'sigma_top' : sigma_top,       # conductivity on top of cortex
+            'lfp' : phi_j[inds],
+            'coord_electrode' : self.z_j[inds],
+            'diam' : self.R_i[inds]*2,        # source diameter
+            'sigma' : self.sigma,           # extracellular conductivity
+            'sigma_top' : self.sigma,       # conductivity on top of cortex
             'f_type' : 'gaussian',  # gaussian filter
             'f_order' : (3, 1),     # 3-point filter, sigma = 1.
         }
@@ -515,694 +745,126 @@ class TestICSD(unittest.TestCase):
         csd = delta_icsd.get_csd()
         
         self.assertEqual(C_i.units, csd.units)
-        nt.assert_array_almost_equal(C_i, csd)
+        nt.assert_allclose(csd.magnitude, C_i[inds].magnitude, rtol=0,
+                           atol=1.5E-6)
 
-
-    def test_DeltaiCSD_02(self):
-        '''test using non-standard SI units 2'''
-        #set some parameters for ground truth csd and csd estimates., e.g.,
+    
+    def test_StepiCSD(self):
+        '''test using standard and non-standard SI units'''
         #we will use same source diameter as in ground truth
-        
-        #contact point coordinates
-        z_j = np.arange(21)*1E-4*pq.m
-        
-        #source coordinates
-        z_i = z_j
-        
-        #current source density magnitude
-        C_i = np.zeros(z_i.size)*pq.A/pq.m**2
-        C_i[7:12:2] += np.array([-.5, 1., -.5])*pq.A/pq.m**2
-        
-        #source radius (delta, step)
-        R_i = np.ones(z_i.size)*1E-3*pq.m
-        
-        #conductivity, use same conductivity for top layer (z_j < 0)
-        sigma = 0.3*pq.S/pq.m
-        sigma_top = sigma
-        
-        #flag for debug plots
-        plot = False
-
-        #get LFP and CSD at contacts
-        phi_j, C_i = get_lfp_of_disks(z_j, z_i, C_i, R_i, sigma,
-                                      plot)
-        delta_input = {
+        phi_j, C_i = self.phi_cylinders, self.C_i_volume
+        step_input = {
             'lfp' : phi_j,
-            'coord_electrode' : z_j*1E3*pq.mm/pq.m,
-            'diam' : R_i.mean()*2*1E3*pq.mm/pq.m,        # source diameter
-            'sigma' : sigma,           # extracellular conductivity
-            'sigma_top' : sigma_top,       # conductivity on top of cortex
-            'f_type' : 'gaussian',  # gaussian filter
-            'f_order' : (3, 1),     # 3-point filter, sigma = 1.
+            'coord_electrode' : self.z_j,
+            'diam' : self.R_i.mean()*2,
+            'sigma' : self.sigma,
+            'sigma_top' : self.sigma,
+            'h' : self.h_i,
+            'tol' : 1E-12,          # Tolerance in numerical integration
+            'f_type' : 'gaussian',
+            'f_order' : (3, 1),
         }
         
-        delta_icsd = icsd.DeltaiCSD(**delta_input)
-        csd = delta_icsd.get_csd()
+        #input changed from standard SI units in each case
+        cases = [
+            ('standard SI units', {}),
+            ('non-standard SI units 1', {'lfp' : phi_j*self.mV_per_V}),
+            ('non-standard SI units 2',
+             {'coord_electrode' : self.z_j*self.mm_per_m,
+              'diam' : self.R_i.mean()*2*self.mm_per_m,
+              'h' : self.h_i*self.mm_per_m}),
+            ('non-standard SI units 3',
+             {'sigma' : self.sigma*self.mS_per_S,
+              'sigma_top' : self.sigma*self.mS_per_S}),
+        ]
+        for units, update in cases:
+            with self.subTest(units=units):
+                step_icsd = icsd.StepiCSD(**dict(step_input, **update))
+                csd = step_icsd.get_csd()
+                
+                self.assertEqual(C_i.units, csd.units)
+                nt.assert_allclose(csd.magnitude, C_i.magnitude, rtol=0,
+                                   atol=1.5E-6)
+
+        
+    def test_StepiCSD_noncontinuous(self):
+        '''test non-continous z_j array'''
+        #we will use same source diameter as in ground truth
+        phi_j, C_i = self.phi_cylinders, self.C_i_volume
+        inds = np.delete(np.arange(21), 5)
+        step_input = {
+            'lfp' : phi_j[inds],
+            'coord_electrode' : self.z_j[inds],
+            'diam' : self.R_i[inds]*2,
+            'sigma' : self.sigma,
+            'sigma_top' : self.sigma,
+            'h' : self.h_i[inds],
+            'tol' : 1E-12,          # Tolerance in numerical integration
+            'f_type' : 'gaussian',
+            'f_order' : (3, 1),
+        }
+        step_icsd = icsd.StepiCSD(**step_input)
+        csd = step_icsd.get_csd()
         
         self.assertEqual(C_i.units, csd.units)
-        nt.assert_array_almost_equal(C_i, csd)
+        nt.assert_allclose(csd.magnitude, C_i[inds].magnitude, rtol=0,
+                           atol=1.5E-6)
 
 
-    def test_DeltaiCSD_03(self):
-        '''test using non-standard SI units 3'''
-        #set some parameters for ground truth csd and csd estimates., e.g.,
+    def test_SplineiCSD(self):
+        '''test using standard and non-standard SI units'''
         #we will use same source diameter as in ground truth
-        
-        #contact point coordinates
-        z_j = np.arange(21)*1E-4*pq.m
-        
-        #source coordinates
-        z_i = z_j
-        
-        #current source density magnitude
-        C_i = np.zeros(z_i.size)*pq.A/pq.m**2
-        C_i[7:12:2] += np.array([-.5, 1., -.5])*pq.A/pq.m**2
-        
-        #source radius (delta, step)
-        R_i = np.ones(z_i.size)*1E-3*pq.m
-        
-        #conductivity, use same conductivity for top layer (z_j < 0)
-        sigma = 0.3*pq.S/pq.m
-        sigma_top = sigma
-        
-        #flag for debug plots
-        plot = False
-
-        #get LFP and CSD at contacts
-        phi_j, C_i = get_lfp_of_disks(z_j, z_i, C_i, R_i, sigma,
-                                      plot)
-        delta_input = {
+        phi_j, C_i = self.phi_spline, self.C_i_spline
+        spline_input = {
             'lfp' : phi_j,
-            'coord_electrode' : z_j,
-            'diam' : R_i.mean()*2,        # source diameter
-            'sigma' : sigma*1E3*pq.mS/pq.S,           # extracellular conductivity
-            'sigma_top' : sigma_top*1E3*pq.mS/pq.S,       # conductivity on top of cortex
-            'f_type' : 'gaussian',  # gaussian filter
-            'f_order' : (3, 1),     # 3-point filter, sigma = 1.
+            'coord_electrode' : self.z_j,
+            'diam' : self.R_i*2,
+            'sigma' : self.sigma,
+            'sigma_top' : self.sigma,
+            'num_steps' : self.num_steps,
+            'tol' : 1E-12,          # Tolerance in numerical integration
+            'f_type' : 'gaussian',
+            'f_order' : (3, 1),
         }
         
-        delta_icsd = icsd.DeltaiCSD(**delta_input)
-        csd = delta_icsd.get_csd()
-        
-        self.assertEqual(C_i.units, csd.units)
-        nt.assert_array_almost_equal(C_i, csd)
+        #input changed from standard SI units in each case
+        cases = [
+            ('standard SI units', {}),
+            ('non-standard SI units 1', {'lfp' : phi_j*self.mV_per_V}),
+            ('non-standard SI units 2',
+             {'coord_electrode' : self.z_j*self.mm_per_m,
+              'diam' : self.R_i*2*self.mm_per_m}),
+            ('non-standard SI units 3',
+             {'sigma' : self.sigma*self.mS_per_S,
+              'sigma_top' : self.sigma*self.mS_per_S}),
+        ]
+        for units, update in cases:
+            with self.subTest(units=units):
+                spline_icsd = icsd.SplineiCSD(**dict(spline_input, **update))
+                csd = spline_icsd.get_csd()
+                
+                self.assertEqual(C_i.units, csd.units)
+                nt.assert_allclose(csd.magnitude, C_i.magnitude, rtol=0,
+                                   atol=1.5E-3)
 
 
-    def test_DeltaiCSD_04(self):
-        '''test non-continous z_j array'''
-        #set some parameters for ground truth csd and csd estimates., e.g.,
-        #we will use same source diameter as in ground truth
-        
-        #contact point coordinates
-        z_j = np.arange(21)*1E-4*pq.m
-        
-        #source coordinates
-        z_i = z_j
-        
-        #current source density magnitude
-        C_i = np.zeros(z_i.size)*pq.A/pq.m**2
-        C_i[7:12:2] += np.array([-.5, 1., -.5])*pq.A/pq.m**2
-        
-        #source radius (delta, step)
-        R_i = np.ones(z_j.size)*1E-3*pq.m
-        
-        #conductivity, use same conductivity for top layer (z_j < 0)
-        sigma = 0.3*pq.S/pq.m
-        sigma_top = sigma
-        
-        #flag for debug plots
-        plot = False
-
-        #get LFP and CSD at contacts
-        phi_j, C_i = get_lfp_of_disks(z_j, z_i, C_i, R_i, sigma,
-                                      plot)
-        inds = np.delete(np.arange(21), 5)
-        delta_input = {
-            'lfp' : phi_j[inds],
-            'coord_electrode' : z_j[inds],
-            'diam' : R_i[inds]*2,        # source diameter
-            'sigma' : sigma,           # extracellular conductivity
-            'sigma_top' : sigma_top,       # conductivity on top of cortex
-            'f_type' : 'gaussian',  # gaussian filter
-            'f_order' : (3, 1),     # 3-point filter, sigma = 1.
-        }
-        
-        delta_icsd = icsd.DeltaiCSD(**delta_input)
-        csd = delta_icsd.get_csd()
-        
-        self.assertEqual(C_i.units, csd.units)
-        nt.assert_array_almost_equal(C_i[inds], csd)
-
-    
-    def test_StepiCSD_units_00(self):
-        '''test using standard SI units'''
-        #set some parameters for ground truth csd and csd estimates., e.g.,
-        #we will use same source diameter as in ground truth
-        
-        #contact point coordinates
-        z_j = np.arange(21)*1E-4*pq.m
-        
-        #source coordinates
-        z_i = z_j
-        
-        #current source density magnitude
-        C_i = np.zeros(z_i.size)*pq.A/pq.m**3
-        C_i[7:12:2] += np.array([-.5, 1., -.5])*pq.A/pq.m**3
-        
-        #source radius (delta, step)
-        R_i = np.ones(z_i.size)*1E-3*pq.m
-        
-        #source height (cylinder)
-        h_i = np.ones(z_i.size)*1E-4*pq.m
-        
-        #conductivity, use same conductivity for top layer (z_j < 0)
-        sigma = 0.3*pq.S/pq.m
-        sigma_top = sigma
-        
-        #flag for debug plots
-        plot = False
-
-        #get LFP and CSD at contacts
-        phi_j, C_i = get_lfp_of_cylinders(z_j, z_i, C_i, R_i, h_i,
-                                          sigma, plot)
-
-        step_input = {
-            'lfp' : phi_j,
-            'coord_electrode' : z_j,
-            'diam' : R_i.mean()*2,
-            'sigma' : sigma,
-            'sigma_top' : sigma,
-            'h' : h_i,
-            'tol' : 1E-12,          # Tolerance in numerical integration
-            'f_type' : 'gaussian',
-            'f_order' : (3, 1),
-        }
-        step_icsd = icsd.StepiCSD(**step_input)
-        csd = step_icsd.get_csd()
-        
-        self.assertEqual(C_i.units, csd.units)
-        nt.assert_array_almost_equal(C_i, csd)
-            
-
-    def test_StepiCSD_01(self):
-        '''test using non-standard SI units 1'''
-        #set some parameters for ground truth csd and csd estimates., e.g.,
-        #we will use same source diameter as in ground truth
-        
-        #contact point coordinates
-        z_j = np.arange(21)*1E-4*pq.m
-        
-        #source coordinates
-        z_i = z_j
-        
-        #current source density magnitude
-        C_i = np.zeros(z_i.size)*pq.A/pq.m**3
-        C_i[7:12:2] += np.array([-.5, 1., -.5])*pq.A/pq.m**3
-        
-        #source radius (delta, step)
-        R_i = np.ones(z_i.size)*1E-3*pq.m
-        
-        #source height (cylinder)
-        h_i = np.ones(z_i.size)*1E-4*pq.m
-        
-        #conductivity, use same conductivity for top layer (z_j < 0)
-        sigma = 0.3*pq.S/pq.m
-        sigma_top = sigma
-        
-        #flag for debug plots
-        plot = False
-
-        #get LFP and CSD at contacts
-        phi_j, C_i = get_lfp_of_cylinders(z_j, z_i, C_i, R_i, h_i,
-                                          sigma, plot)
-
-        step_input = {
-            'lfp' : phi_j*1E3*pq.mV/pq.V,
-            'coord_electrode' : z_j,
-            'diam' : R_i.mean()*2,
-            'sigma' : sigma,
-            'sigma_top' : sigma,
-            'h' : h_i,
-            'tol' : 1E-12,          # Tolerance in numerical integration
-            'f_type' : 'gaussian',
-            'f_order' : (3, 1),
-        }
-        step_icsd = icsd.StepiCSD(**step_input)
-        csd = step_icsd.get_csd()
-        
-        self.assertEqual(C_i.units, csd.units)
-        nt.assert_array_almost_equal(C_i, csd)
-
-        
-    def test_StepiCSD_02(self):
-        '''test using non-standard SI units 2'''
-        #set some parameters for ground truth csd and csd estimates., e.g.,
-        #we will use same source diameter as in ground truth
-        
-        #contact point coordinates
-        z_j = np.arange(21)*1E-4*pq.m
-        
-        #source coordinates
-        z_i = z_j
-        
-        #current source density magnitude
-        C_i = np.zeros(z_i.size)*pq.A/pq.m**3
-        C_i[7:12:2] += np.array([-.5, 1., -.5])*pq.A/pq.m**3
-        
-        #source radius (delta, step)
-        R_i = np.ones(z_i.size)*1E-3*pq.m
-        
-        #source height (cylinder)
-        h_i = np.ones(z_i.size)*1E-4*pq.m
-        
-        #conductivity, use same conductivity for top layer (z_j < 0)
-        sigma = 0.3*pq.S/pq.m
-        sigma_top = sigma
-        
-        #flag for debug plots
-        plot = False
-
-        #get LFP and CSD at contacts
-        phi_j, C_i = get_lfp_of_cylinders(z_j, z_i, C_i, R_i, h_i,
-                                          sigma, plot)
-
-        step_input = {
-            'lfp' : phi_j,
-            'coord_electrode' : z_j*1E3*pq.mm/pq.m,
-            'diam' : R_i.mean()*2*1E3*pq.mm/pq.m,
-            'sigma' : sigma,
-            'sigma_top' : sigma,
-            'h' : h_i*1E3*pq.mm/pq.m,
-            'tol' : 1E-12,          # Tolerance in numerical integration
-            'f_type' : 'gaussian',
-            'f_order' : (3, 1),
-        }
-        step_icsd = icsd.StepiCSD(**step_input)
-        csd = step_icsd.get_csd()
-        
-        self.assertEqual(C_i.units, csd.units)
-        nt.assert_array_almost_equal(C_i, csd)
-
-
-    def test_StepiCSD_03(self):
-        '''test using non-standard SI units 3'''
-        #set some parameters for ground truth csd and csd estimates., e.g.,
-        #we will use same source diameter as in ground truth
-        
-        #contact point coordinates
-        z_j = np.arange(21)*1E-4*pq.m
-        
-        #source coordinates
-        z_i = z_j
-        
-        #current source density magnitude
-        C_i = np.zeros(z_i.size)*pq.A/pq.m**3
-        C_i[7:12:2] += np.array([-.5, 1., -.5])*pq.A/pq.m**3
-        
-        #source radius (delta, step)
-        R_i = np.ones(z_i.size)*1E-3*pq.m
-        
-        #source height (cylinder)
-        h_i = np.ones(z_i.size)*1E-4*pq.m
-        
-        #conductivity, use same conductivity for top layer (z_j < 0)
-        sigma = 0.3*pq.S/pq.m
-        sigma_top = sigma
-        
-        #flag for debug plots
-        plot = False
-
-        #get LFP and CSD at contacts
-        phi_j, C_i = get_lfp_of_cylinders(z_j, z_i, C_i, R_i, h_i,
-                                          sigma, plot)
-
-        step_input = {
-            'lfp' : phi_j,
-            'coord_electrode' : z_j,
-            'diam' : R_i.mean()*2,
-            'sigma' : sigma*1E3*pq.mS/pq.S,
-            'sigma_top' : sigma*1E3*pq.mS/pq.S,
-            'h' : h_i,
-            'tol' : 1E-12,          # Tolerance in numerical integration
-            'f_type' : 'gaussian',
-            'f_order' : (3, 1),
-        }
-        step_icsd = icsd.StepiCSD(**step_input)
-        csd = step_icsd.get_csd()
-        
-        self.assertEqual(C_i.units, csd.units)
-        nt.assert_array_almost_equal(C_i, csd)
-
-        
-    def test_StepiCSD_units_04(self):
-        '''test non-continous z_j array'''
-        #set some parameters for ground truth csd and csd estimates., e.g.,
-        #we will use same source diameter as in ground truth
-        
-        #contact point coordinates
-        z_j = np.arange(21)*1E-4*pq.m
-        
-        #source coordinates
-        z_i = z_j
-        
-        #current source density magnitude
-        C_i = np.zeros(z_i.size)*pq.A/pq.m**3
-        C_i[7:12:2] += np.array([-.5, 1., -.5])*pq.A/pq.m**3
-        
-        #source radius (delta, step)
-        R_i = np.ones(z_i.size)*1E-3*pq.m
-        
-        #source height (cylinder)
-        h_i = np.ones(z_i.size)*1E-4*pq.m
-        
-        #conductivity, use same conductivity for top layer (z_j < 0)
-        sigma = 0.3*pq.S/pq.m
-        sigma_top = sigma
-        
-        #flag for debug plots
-        plot = False
-
-        #get LFP and CSD at contacts
-        phi_j, C_i = get_lfp_of_cylinders(z_j, z_i, C_i, R_i, h_i,
-                                          sigma, plot)
-        inds = np.delete(np.arange(21), 5)
-        step_input = {
-            'lfp' : phi_j[inds],
-            'coord_electrode' : z_j[inds],
-            'diam' : R_i[inds]*2,
-            'sigma' : sigma,
-            'sigma_top' : sigma,
-            'h' : h_i[inds],
-            'tol' : 1E-12,          # Tolerance in numerical integration
-            'f_type' : 'gaussian',
-            'f_order' : (3, 1),
-        }
-        step_icsd = icsd.StepiCSD(**step_input)
-        csd = step_icsd.get_csd()
-        
-        self.assertEqual(C_i.units, csd.units)
-        nt.assert_array_almost_equal(C_i[inds], csd)
-
-
-    def test_SplineiCSD_00(self):
-        '''test using standard SI units'''
-        #set some parameters for ground truth csd and csd estimates., e.g.,
-        #we will use same source diameter as in ground truth
-        
-        #contact point coordinates
-        z_j = np.arange(21)*1E-4*pq.m
-        
-        #source coordinates
-        z_i = z_j
-        
-        #current source density magnitude
-        C_i = np.zeros(z_i.size)*pq.A/pq.m**3
-        C_i[7:12:2] += np.array([-.5, 1., -.5])*pq.A/pq.m**3
-                
-        #source radius (delta, step)
-        R_i = np.ones(z_i.size)*1E-3*pq.m
-        
-        #source height (cylinder)
-        h_i = np.ones(z_i.size)*1E-4*pq.m
-        
-        #conductivity, use same conductivity for top layer (z_j < 0)
-        sigma = 0.3*pq.S/pq.m
-        sigma_top = sigma
-
-        #construct interpolators, spline method assume underlying source
-        #pattern generating LFPs that are cubic spline interpolates between
-        #contacts so we generate CSD data relying on the same assumption 
-        f_C = interp1d(z_i, C_i, kind='cubic')
-        f_R = interp1d(z_i, R_i)
-        num_steps = 201
-        z_i_i = np.linspace(float(z_i[0]), float(z_i[-1]), num_steps)*z_i.units
-        C_i_i = f_C(np.asarray(z_i_i))*C_i.units
-        R_i_i = f_R(z_i_i)*R_i.units
-
-        h_i_i = np.ones(z_i_i.size)*np.diff(z_i_i).min()
-        
-        #flag for debug plots
-        plot = False
-
-        #get LFP and CSD at contacts
-        phi_j, C_i = get_lfp_of_cylinders(z_j, z_i_i, C_i_i, R_i_i, h_i_i,
-                                          sigma, plot)
-
-        spline_input = {
-            'lfp' : phi_j,
-            'coord_electrode' : z_j,
-            'diam' : R_i*2,
-            'sigma' : sigma,
-            'sigma_top' : sigma,
-            'num_steps' : num_steps,
-            'tol' : 1E-12,          # Tolerance in numerical integration
-            'f_type' : 'gaussian',
-            'f_order' : (3, 1),
-        }
-        spline_icsd = icsd.SplineiCSD(**spline_input)
-        csd = spline_icsd.get_csd()
-        
-        self.assertEqual(C_i.units, csd.units)
-        nt.assert_array_almost_equal(C_i, csd, decimal=3)
-
-
-    def test_SplineiCSD_01(self):
-        '''test using standard SI units, deep electrode coordinates'''
-        #set some parameters for ground truth csd and csd estimates., e.g.,
+    def test_SplineiCSD_deep_electrodes(self):
+        '''test using standard SI units, deep electrode coordinates'''
         #we will use same source diameter as in ground truth
         
         #contact point coordinates
         z_j = np.arange(10, 31)*1E-4*pq.m
         
-        #source coordinates
-        z_i = z_j
-        
-        #current source density magnitude
-        C_i = np.zeros(z_i.size)*pq.A/pq.m**3
-        C_i[7:12:2] += np.array([-.5, 1., -.5])*pq.A/pq.m**3
-                
-        #source radius (delta, step)
-        R_i = np.ones(z_i.size)*1E-3*pq.m
-        
-        #source height (cylinder)
-        h_i = np.ones(z_i.size)*1E-4*pq.m
-        
-        #conductivity, use same conductivity for top layer (z_j < 0)
-        sigma = 0.3*pq.S/pq.m
-        sigma_top = sigma
-
-        #construct interpolators, spline method assume underlying source
-        #pattern generating LFPs that are cubic spline interpolates between
-        #contacts so we generate CSD data relying on the same assumption 
-        f_C = interp1d(z_i, C_i, kind='cubic')
-        f_R = interp1d(z_i, R_i)
-        num_steps = 201
-        z_i_i = np.linspace(float(z_i[0]), float(z_i[-1]), num_steps)*z_i.units
-        C_i_i = f_C(np.asarray(z_i_i))*C_i.units
-        R_i_i = f_R(z_i_i)*R_i.units
-
-        h_i_i = np.ones(z_i_i.size)*np.diff(z_i_i).min()
-        
-        #flag for debug plots
-        plot = False
-
-        #get LFP and CSD at contacts
-        phi_j, C_i = get_lfp_of_cylinders(z_j, z_i_i, C_i_i, R_i_i, h_i_i,
-                                          sigma, plot)
-
-        spline_input = {
-            'lfp' : phi_j,
-            'coord_electrode' : z_j,
-            'diam' : R_i*2,
-            'sigma' : sigma,
-            'sigma_top' : sigma,
-            'num_steps' : num_steps,
-            'tol' : 1E-12,          # Tolerance in numerical integration
-            'f_type' : 'gaussian',
-            'f_order' : (3, 1),
-        }
-        spline_icsd = icsd.SplineiCSD(**spline_input)
-        csd = spline_icsd.get_csd()
-        
-        self.assertEqual(C_i.units, csd.units)
-        nt.assert_array_almost_equal(C_i, csd, decimal=3)
-
-
-    def test_SplineiCSD_02(self):
-        '''test using non-standard SI units'''
-        #set some parameters for ground truth csd and csd estimates., e.g.,
-        #we will use same source diameter as in ground truth
-        
-        #contact point coordinates
-        z_j = np.arange(21)*1E-4*pq.m
-        
-        #source coordinates
-        z_i = z_j
-        
-        #current source density magnitude
-        C_i = np.zeros(z_i.size)*pq.A/pq.m**3
-        C_i[7:12:2] += np.array([-.5, 1., -.5])*pq.A/pq.m**3
-                
-        #source radius (delta, step)
-        R_i = np.ones(z_i.size)*1E-3*pq.m
-        
-        #source height (cylinder)
-        h_i = np.ones(z_i.size)*1E-4*pq.m
-        
-        #conductivity, use same conductivity for top layer (z_j < 0)
-        sigma = 0.3*pq.S/pq.m
-        sigma_top = sigma
-
-        #construct interpolators, spline method assume underlying source
-        #pattern generating LFPs that are cubic spline interpolates between
-        #contacts so we generate CSD data relying on the same assumption 
-        f_C = interp1d(z_i, C_i, kind='cubic')
-        f_R = interp1d(z_i, R_i)
-        num_steps = 201
-        z_i_i = np.linspace(float(z_i[0]), float(z_i[-1]), num_steps)*z_i.units
-        C_i_i = f_C(np.asarray(z_i_i))*C_i.units
-        R_i_i = f_R(z_i_i)*R_i.units
-
-        h_i_i = np.ones(z_i_i.size)*np.diff(z_i_i).min()
-        
-        #flag for debug plots
-        plot = False
-
-        #get LFP and CSD at contacts
-        phi_j, C_i = get_lfp_of_cylinders(z_j, z_i_i, C_i_i, R_i_i, h_i_i,
-                                          sigma, plot)
-
-        spline_input = {
-            'lfp' : phi_j*1E3*pq.mV/pq.V,
-            'coord_electrode' : z_j,
-            'diam' : R_i*2,
-            'sigma' : sigma,
-            'sigma_top' : sigma,
-            'num_steps' : num_steps,
-            'tol' : 1E-12,          # Tolerance in numerical integration
-            'f_type' : 'gaussian',
-            'f_order' : (3, 1),
-        }
-        spline_icsd = icsd.SplineiCSD(**spline_input)
-        csd = spline_icsd.get_csd()
-        
-        self.assertEqual(C_i.units, csd.units)
-        nt.assert_array_almost_equal(C_i, csd, decimal=3)
-
-
-    def test_SplineiCSD_03(self):
-        '''test using standard SI units'''
-        #set some parameters for ground truth csd and csd estimates., e.g.,
-        #we will use same source diameter as in ground truth
-        
-        #contact point coordinates
-        z_j = np.arange(21)*1E-4*pq.m
-        
-        #source coordinates
-        z_i = z_j
-        
-        #current source density magnitude
-        C_i = np.zeros(z_i.size)*pq.A/pq.m**3
-        C_i[7:12:2] += np.array([-.5, 1., -.5])*pq.A/pq.m**3
-                
-        #source radius (delta, step)
-        R_i = np.ones(z_i.size)*1E-3*pq.m
-        
-        #source height (cylinder)
-        h_i = np.ones(z_i.size)*1E-4*pq.m
-        
-        #conductivity, use same conductivity for top layer (z_j < 0)
-        sigma = 0.3*pq.S/pq.m
-        sigma_top = sigma
-
-        #construct interpolators, spline method assume underlying source
-        #pattern generating LFPs that are cubic spline interpolates between
-        #contacts so we generate CSD data relying on the same assumption 
-        f_C = interp1d(z_i, C_i, kind='cubic')
-        f_R = interp1d(z_i, R_i)
-        num_steps = 201
-        z_i_i = np.linspace(float(z_i[0]), float(z_i[-1]), num_steps)*z_i.units
-        C_i_i = f_C(np.asarray(z_i_i))*C_i.units
-        R_i_i = f_R(z_i_i)*R_i.units
-
-        h_i_i = np.ones(z_i_i.size)*np.diff(z_i_i).min()
-        
-        #flag for debug plots
-        plot = False
-
-        #get LFP and CSD at contacts
-        phi_j, C_i = get_lfp_of_cylinders(z_j, z_i_i, C_i_i, R_i_i, h_i_i,
-                                          sigma, plot)
-
-        spline_input = {
-            'lfp' : phi_j,
-            'coord_electrode' : z_j*1E3*pq.mm/pq.m,
-            'diam' : R_i*2*1E3*pq.mm/pq.m,
-            'sigma' : sigma,
-            'sigma_top' : sigma,
-            'num_steps' : num_steps,
-            'tol' : 1E-12,          # Tolerance in numerical integration
-            'f_type' : 'gaussian',
-            'f_order' : (3, 1),
-        }
-        spline_icsd = icsd.SplineiCSD(**spline_input)
-        csd = spline_icsd.get_csd()
-        
-        self.assertEqual(C_i.units, csd.units)
-        nt.assert_array_almost_equal(C_i, csd, decimal=3)
-        
-
-    def test_SplineiCSD_04(self):
-        '''test using standard SI units'''
-        #set some parameters for ground truth csd and csd estimates., e.g.,
-        #we will use same source diameter as in ground truth
-        
-        #contact point coordinates
-        z_j = np.arange(21)*1E-4*pq.m
-        
-        #source coordinates
-        z_i = z_j
-        
-        #current source density magnitude
-        C_i = np.zeros(z_i.size)*pq.A/pq.m**3
-        C_i[7:12:2] += np.array([-.5, 1., -.5])*pq.A/pq.m**3
-                
-        #source radius (delta, step)
-        R_i = np.ones(z_i.size)*1E-3*pq.m
-        
-        #source height (cylinder)
-        h_i = np.ones(z_i.size)*1E-4*pq.m
-        
-        #conductivity, use same conductivity for top layer (z_j < 0)
-        sigma = 0.3*pq.S/pq.m
-        sigma_top = sigma
-
-        #construct interpolators, spline method assume underlying source
-        #pattern generating LFPs that are cubic spline interpolates between
-        #contacts so we generate CSD data relying on the same assumption 
-        f_C = interp1d(z_i, C_i, kind='cubic')
-        f_R = interp1d(z_i, R_i)
-        num_steps = 201
-        z_i_i = np.linspace(float(z_i[0]), float(z_i[-1]), num_steps)*z_i.units
-        C_i_i = f_C(np.asarray(z_i_i))*C_i.units
-        R_i_i = f_R(z_i_i)*R_i.units
-
-        h_i_i = np.ones(z_i_i.size)*np.diff(z_i_i).min()
-        
-        #flag for debug plots
-        plot = False
-
         #get LFP and CSD at contacts
-        phi_j, C_i = get_lfp_of_cylinders(z_j, z_i_i, C_i_i, R_i_i, h_i_i,
-                                          sigma, plot)
+        phi_j, C_i = self.get_lfp_of_spline(z_j)
 
         spline_input = {
             'lfp' : phi_j,
             'coord_electrode' : z_j,
-            'diam' : R_i*2,
-            'sigma' : sigma*1E3*pq.mS/pq.S,
-            'sigma_top' : sigma*1E3*pq.mS/pq.S,
-            'num_steps' : num_steps,
+            'diam' : self.R_i*2,
+            'sigma' : self.sigma,
+            'sigma_top' : self.sigma,
+            'num_steps' : self.num_steps,
             'tol' : 1E-12,          # Tolerance in numerical integration
             'f_type' : 'gaussian',
             'f_order' : (3, 1),
@@ -1211,7 +873,8 @@ class TestICSD(unittest.TestCase):
         csd = spline_icsd.get_csd()
         
         self.assertEqual(C_i.units, csd.units)
-        nt.assert_array_almost_equal(C_i, csd, decimal=3)
+        nt.assert_allclose(csd.magnitude, C_i.magnitude, rtol=0,
+                           atol=1.5E-3)
 
                 
 #def suite(verbosity=2):